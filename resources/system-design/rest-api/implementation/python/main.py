@@ -3,27 +3,54 @@ REST API Implementation with FastAPI
 
 Demonstrates REST best practices:
 - CRUD operations with proper HTTP methods
-- Request/response validation with Pydantic
+- Request validation with Pydantic, response encoding with msgspec
 - Pagination and filtering
 - Error handling
 - Rate limiting
 - API versioning
 - Automatic OpenAPI documentation
 """
+import hashlib
+import logging
+import msgspec
+import os
 import time
 
-from datetime import datetime
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import defaultdict
+from datetime import datetime, timezone
+from functools import lru_cache
+from operator import attrgetter
 from fastapi import FastAPI, HTTPException, Query, Header, status, Depends
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel, EmailStr, Field
-from typing import Optional, List
+from fastapi.responses import Response
+from pydantic import AfterValidator, BaseModel, Field, WithJsonSchema, field_validator
+from pydantic.networks import validate_email
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+from sortedcontainers import SortedKeyList
+from typing import Annotated, Dict, List, Optional
 from uuid import uuid4, UUID
 
 # ============= Pydantic Models ============= #
 
+@lru_cache(maxsize=4096)
+def normalize_email(value: str) -> str:
+    """Validate an email address, caching the result per distinct value"""
+    return validate_email(value)[1]
+
+
+# Same checks and schema as EmailStr, but repeat addresses (e.g. a PUT that
+# keeps the email unchanged) skip the email-validator regex/IDNA work
+CachedEmailStr = Annotated[
+    str,
+    AfterValidator(normalize_email),
+    WithJsonSchema({"type": "string", "format": "email"})
+]
+
+
 class UserBase(BaseModel):
     name: str = Field(..., min_length=1, max_length=100)
-    email: EmailStr
+    email: CachedEmailStr
 
 
 class UserCreate(UserBase):
@@ -35,7 +62,15 @@ class UserUpdate(UserBase):
 
 class UserPartialUpdate(BaseModel):
     name: Optional[str] = Field(None, min_length=1, max_length=100)
-    email: Optional[EmailStr] = None
+    email: Optional[CachedEmailStr] = None
+    
+    @field_validator("name", "email")
+    @classmethod
+    def reject_null(cls, value):
+        """Fields may be omitted, but stored users always have a name and email"""
+        if value is None:
+            raise ValueError("may be omitted but not null")
+        return value
 
 
 class User(UserBase):
@@ -71,6 +106,7 @@ class PaginationMetadata(BaseModel):
     limit: int
     offset: int
     has_more: bool
+    next_cursor: Optional[str] = None
 
 
 class UserListResponse(BaseModel):
@@ -88,6 +124,41 @@ class HealthResponse(BaseModel):
     timestamp: datetime
 
 
+# ============= Storage Records ============= #
+# Stored data is built from already-validated requests, so it lives in
+# msgspec Structs: cheap to construct and encoded to JSON in C.
+# Field order matches the Pydantic models above, which document the API.
+# Structs are already slotted (no per-instance __dict__); gc=False also drops
+# the GC header, which is safe because records only hold scalar values.
+
+class UserRecord(msgspec.Struct, gc=False):
+    name: str
+    email: str
+    id: UUID
+    created_at: datetime
+    updated_at: datetime
+
+
+class PostRecord(msgspec.Struct, gc=False):
+    title: str
+    content: str
+    id: UUID
+    user_id: UUID
+    created_at: datetime
+    updated_at: datetime
+
+
+json_encoder = msgspec.json.Encoder()
+
+
+class MsgspecJSONResponse(Response):
+    """JSON response rendered by msgspec (no jsonable_encoder pass)"""
+    media_type = "application/json"
+    
+    def render(self, content) -> bytes:
+        return json_encoder.encode(content)
+
+
 # ============= FastAPI App ============= #
 
 app = FastAPI(
@@ -95,16 +166,68 @@ app = FastAPI(
     description="A comprehensive REST API implementation demonstrating best practices",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=MsgspecJSONResponse
 )
 
+# Log through uvicorn's 'uvicorn.error' logger: uvicorn attaches its handlers
+# there, while a bare getLogger(__name__) has none and would drop INFO lines
+logger = logging.getLogger("uvicorn.error")
+
 # In-memory database (simplified - use a real database in production)
-users_db = {}
-posts_db = {}
+# Keyed by UUID objects, which FastAPI already parses from path parameters
+users_db: Dict[UUID, UserRecord] = {}
+posts_db: Dict[UUID, PostRecord] = {}
+
+def created_order(item):
+    """Sort key for users and posts; the id breaks created_at ties"""
+    return item.created_at, item.id
 
-# Rate limiting (simplified - use Redis in production)
+
+# Users ordered by creation time, so the default sort is a slice
+users_by_created = SortedKeyList(key=created_order)
+
+# Posts per user, in creation order
+posts_by_user = defaultdict(lambda: SortedKeyList(key=created_order))
+
+# C-level key functions for the sortable user fields
+SORT_KEYS = {
+    field: attrgetter(field)
+    for field in ("id", "name", "email", "created_at", "updated_at")
+}
+
+# Rate limiting: shared across workers via Redis when REDIS_URL is set,
+# otherwise (or while Redis is unreachable) kept in this process only
+REDIS_URL = os.getenv("REDIS_URL")
+redis_client = None
+token_bucket_script = None
 rate_limit_storage = {}
 
+# Atomic token bucket: refill, check and consume in a single round trip
+TOKEN_BUCKET_LUA = """
+local key = KEYS[1]
+local capacity = tonumber(ARGV[1])
+local refill_rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+
+local bucket = redis.call('HMGET', key, 'tokens', 'last_refill')
+local tokens = tonumber(bucket[1]) or capacity
+local last_refill = tonumber(bucket[2]) or now
+
+tokens = math.min(capacity, tokens + (now - last_refill) * refill_rate)
+
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+
+redis.call('HSET', key, 'tokens', tokens, 'last_refill', now)
+redis.call('EXPIRE', key, math.ceil(capacity / refill_rate))
+
+return allowed
+"""
+
 
 # ============= Dependencies ============= #
 
@@ -118,38 +241,93 @@ def verify_auth(authorization: Optional[str] = Header(None)):
     return authorization
 
 
-def rate_limiter(max_requests: int = 100, window_seconds: int = 3600):
-    """Simple rate limiting dependency"""
-    def limiter(authorization: Optional[str] = Header(None)):
+def rate_limiter(max_requests: int = 100, window_seconds: int = 3600, require_auth: bool = False):
+    """Token bucket rate limiting dependency
+    
+    With require_auth it also does verify_auth's check and returns the
+    authorization header, so write routes parse the header only once.
+    """
+    capacity = max_requests
+    refill_rate = max_requests / window_seconds  # tokens per second
+    
+    # Bind hot lookups once per limiter instead of per request
+    storage = rate_limit_storage
+    clock = time.time
+    
+    async def limiter(authorization: Optional[str] = Header(None)):
+        if require_auth:
+            verify_auth(authorization)
+        
         if not authorization:
             client_id = "anonymous"
         else:
             client_id = authorization
         
-        current_time = time.time()
+        current_time = clock()
+        
+        if token_bucket_script is not None:
+            # Key on a digest so bearer tokens never appear in shared Redis key names
+            key_id = hashlib.sha256(client_id.encode()).hexdigest()
+            try:
+                allowed = await token_bucket_script(
+                    keys=[f"rate_limit:{key_id}"],
+                    args=[capacity, refill_rate, current_time]
+                )
+            except RedisError as exc:
+                # Redis unreachable: fall back to this process's bucket below
+                logger.warning("Redis rate limit check failed, using local bucket: %s", exc)
+            else:
+                if not allowed:
+                    raise HTTPException(
+                        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                        detail="Rate limit exceeded"
+                    )
+                return authorization if require_auth else True
         
-        if client_id not in rate_limit_storage:
-            rate_limit_storage[client_id] = []
+        # Each client only keeps (tokens, last_refill_time)
+        tokens, last_refill = storage.get(client_id, (capacity, current_time))
         
-        # Remove old requests outside the window
-        rate_limit_storage[client_id] = [
-            req_time for req_time in rate_limit_storage[client_id]
-            if current_time - req_time < window_seconds
-        ]
+        # Refill tokens for the time elapsed since the last request
+        tokens = min(capacity, tokens + (current_time - last_refill) * refill_rate)
         
         # Check rate limit
-        if len(rate_limit_storage[client_id]) >= max_requests:
+        if tokens < 1:
+            storage[client_id] = (tokens, current_time)
             raise HTTPException(
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS,
                 detail="Rate limit exceeded"
             )
         
-        rate_limit_storage[client_id].append(current_time)
-        return True
+        storage[client_id] = (tokens - 1, current_time)
+        return authorization if require_auth else True
     
     return limiter
 
 
+# ============= Pagination Helpers =============
+
+def encode_cursor(item) -> str:
+    """Encode an opaque cursor pointing just after item"""
+    raw = f"{item.created_at.isoformat()}|{item.id}"
+    return urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """Decode a cursor back into its (created_at, id) sort key"""
+    try:
+        created_at, item_id = urlsafe_b64decode(cursor.encode()).decode().split("|")
+        created_at = datetime.fromisoformat(created_at)
+        # Stored timestamps are UTC-aware; a naive one cannot be compared
+        if created_at.tzinfo is None:
+            raise ValueError("cursor timestamp has no timezone")
+        return created_at, UUID(item_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
 # ============= User Endpoints =============
 
 @app.get(
@@ -161,6 +339,7 @@ def rate_limiter(max_requests: int = 100, window_seconds: int = 3600):
 async def list_users(
     limit: int = Query(10, ge=1, le=100, description="Number of items to return"),
     offset: int = Query(0, ge=0, description="Number of items to skip"),
+    cursor: Optional[str] = Query(None, description="Cursor from a previous page (created_at sort only)"),
     sort: str = Query("created_at", description="Sort field (prefix with - for descending)"),
     _: bool = Depends(rate_limiter(max_requests=100, window_seconds=3600))
 ):
@@ -169,35 +348,69 @@ async def list_users(
     
     - **limit**: Maximum number of users to return (1-100)
     - **offset**: Number of users to skip
+    - **cursor**: Resume after the last user of a previous page (overrides offset)
     - **sort**: Field to sort by (use -field for descending order)
     """
-    users_list = list(users_db.values())
-    total = len(users_list)
+    total = len(users_db)
+    next_cursor = None
     
     # Sort
     reverse = sort.startswith('-')
     sort_key = sort[1:] if reverse else sort
     
-    try:
-        users_list.sort(key=lambda x: getattr(x, sort_key, ''), reverse=reverse)
-    except AttributeError:
+    if sort_key == "created_at":
+        # Paginate straight from the pre-sorted index
+        if reverse:
+            if cursor:
+                stop = users_by_created.bisect_key_left(decode_cursor(cursor))
+            else:
+                stop = max(total - offset, 0)
+            start = max(stop - limit, 0)
+            paginated_users = list(users_by_created.islice(start, stop, reverse=True))
+            has_more = start > 0
+        else:
+            if cursor:
+                start = users_by_created.bisect_key_right(decode_cursor(cursor))
+            else:
+                start = offset
+            stop = start + limit
+            paginated_users = list(users_by_created.islice(start, stop))
+            has_more = stop < total
+        
+        if has_more:
+            next_cursor = encode_cursor(paginated_users[-1])
+    elif cursor:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Invalid sort field: {sort_key}"
+            detail="Cursor pagination requires sort=created_at or sort=-created_at"
         )
-    
-    # Paginate
-    paginated_users = users_list[offset:offset + limit]
-    
-    return UserListResponse(
-        data=paginated_users,
-        pagination=PaginationMetadata(
-            total=total,
-            limit=limit,
-            offset=offset,
-            has_more=offset + limit < total
-        )
-    )
+    else:
+        key_func = SORT_KEYS.get(sort_key)
+        
+        if key_func is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid sort field: {sort_key}"
+            )
+        
+        users_list = list(users_db.values())
+        users_list.sort(key=key_func, reverse=reverse)
+        
+        # Paginate
+        paginated_users = users_list[offset:offset + limit]
+        has_more = offset + limit < total
+    
+    # Stored users were validated on write, so skip response_model re-validation
+    return MsgspecJSONResponse({
+        "data": paginated_users,
+        "pagination": {
+            "total": total,
+            "limit": limit,
+            "offset": offset,
+            "has_more": has_more,
+            "next_cursor": next_cursor
+        }
+    })
 
 
 @app.get(
@@ -212,7 +425,7 @@ async def get_user(user_id: UUID):
     
     Returns 404 if user not found.
     """
-    user = users_db.get(str(user_id))
+    user = users_db.get(user_id)
     
     if not user:
         raise HTTPException(
@@ -220,7 +433,7 @@ async def get_user(user_id: UUID):
             detail="User not found"
         )
     
-    return user
+    return MsgspecJSONResponse(user)
 
 
 @app.post(
@@ -232,18 +445,18 @@ async def get_user(user_id: UUID):
 )
 async def create_user(
     user_data: UserCreate,
-    authorization: str = Depends(verify_auth),
-    _: bool = Depends(rate_limiter(max_requests=20, window_seconds=3600))
+    authorization: str = Depends(rate_limiter(max_requests=20, window_seconds=3600, require_auth=True))
 ):
     """
     Create a new user.
     
     Requires authentication.
     """
-    user_id = str(uuid4())
-    now = datetime.utcnow()
+    user_id = uuid4()
+    now = datetime.now(timezone.utc)
     
-    user = User(
+    # user_data was already validated by FastAPI; Structs do not re-validate
+    user = UserRecord(
         id=user_id,
         name=user_data.name,
         email=user_data.email,
@@ -252,8 +465,9 @@ async def create_user(
     )
     
     users_db[user_id] = user
+    users_by_created.add(user)
     
-    return user
+    return MsgspecJSONResponse(user, status_code=status.HTTP_201_CREATED)
 
 
 @app.put(
@@ -272,7 +486,7 @@ async def update_user(
     
     All fields must be provided. Use PATCH for partial updates.
     """
-    user = users_db.get(str(user_id))
+    user = users_db.get(user_id)
     
     if not user:
         raise HTTPException(
@@ -282,9 +496,9 @@ async def update_user(
     
     user.name = user_data.name
     user.email = user_data.email
-    user.updated_at = datetime.utcnow()
+    user.updated_at = datetime.now(timezone.utc)
     
-    return user
+    return MsgspecJSONResponse(user)
 
 
 @app.patch(
@@ -303,7 +517,7 @@ async def patch_user(
     
     Only provided fields will be updated.
     """
-    user = users_db.get(str(user_id))
+    user = users_db.get(user_id)
     
     if not user:
         raise HTTPException(
@@ -311,15 +525,14 @@ async def patch_user(
             detail="User not found"
         )
     
-    # Update only provided fields
-    update_data = user_data.model_dump(exclude_unset=True)
-    
-    for field, value in update_data.items():
-        setattr(user, field, value)
+    # Update only provided fields; iterating the set fields avoids the
+    # intermediate dict from model_dump(exclude_unset=True)
+    for field in user_data.__pydantic_fields_set__:
+        setattr(user, field, getattr(user_data, field))
     
-    user.updated_at = datetime.utcnow()
+    user.updated_at = datetime.now(timezone.utc)
     
-    return user
+    return MsgspecJSONResponse(user)
 
 
 @app.delete(
@@ -337,13 +550,14 @@ async def delete_user(
     
     Returns 204 No Content on success.
     """
-    if str(user_id) not in users_db:
+    if user_id not in users_db:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
     
-    del users_db[str(user_id)]
+    users_by_created.remove(users_db.pop(user_id))
+    posts_by_user.pop(user_id, None)
     return None
 
 
@@ -358,35 +572,41 @@ async def delete_user(
 async def list_user_posts(
     user_id: UUID,
     limit: int = Query(10, ge=1, le=100),
-    offset: int = Query(0, ge=0)
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None)
 ):
     """
-    Retrieve all posts for a specific user.
+    Retrieve all posts for a specific user, oldest first.
     """
-    if str(user_id) not in users_db:
+    if user_id not in users_db:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
     
-    # Filter posts by user_id
-    user_posts = [
-        post for post in posts_db.values()
-        if str(post.user_id) == str(user_id)
-    ]
-    
+    user_posts = posts_by_user.get(user_id, [])
     total = len(user_posts)
-    paginated_posts = user_posts[offset:offset + limit]
-    
-    return PostListResponse(
-        data=paginated_posts,
-        pagination=PaginationMetadata(
-            total=total,
-            limit=limit,
-            offset=offset,
-            has_more=offset + limit < total
-        )
-    )
+    
+    if cursor:
+        # Decode even when there are no posts, so a bad cursor is always a 400
+        key = decode_cursor(cursor)
+        start = user_posts.bisect_key_right(key) if user_posts else 0
+    else:
+        start = offset
+    stop = start + limit
+    paginated_posts = user_posts[start:stop]
+    has_more = stop < total
+    
+    return MsgspecJSONResponse({
+        "data": paginated_posts,
+        "pagination": {
+            "total": total,
+            "limit": limit,
+            "offset": offset,
+            "has_more": has_more,
+            "next_cursor": encode_cursor(paginated_posts[-1]) if has_more else None
+        }
+    })
 
 
 @app.post(
@@ -404,16 +624,16 @@ async def create_post(
     """
     Create a new post for a user.
     """
-    if str(user_id) not in users_db:
+    if user_id not in users_db:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
     
-    post_id = str(uuid4())
-    now = datetime.utcnow()
+    post_id = uuid4()
+    now = datetime.now(timezone.utc)
     
-    post = Post(
+    post = PostRecord(
         id=post_id,
         user_id=user_id,
         title=post_data.title,
@@ -423,8 +643,9 @@ async def create_post(
     )
     
     posts_db[post_id] = post
+    posts_by_user[user_id].add(post)
     
-    return post
+    return MsgspecJSONResponse(post, status_code=status.HTTP_201_CREATED)
 
 
 @app.get(
@@ -437,7 +658,7 @@ async def get_post(post_id: UUID):
     """
     Retrieve a specific post by ID.
     """
-    post = posts_db.get(str(post_id))
+    post = posts_db.get(post_id)
     
     if not post:
         raise HTTPException(
@@ -445,7 +666,7 @@ async def get_post(post_id: UUID):
             detail="Post not found"
         )
     
-    return post
+    return MsgspecJSONResponse(post)
 
 
 # ============= Health & Info Endpoints =============
@@ -462,7 +683,7 @@ async def health_check():
     """
     return HealthResponse(
         status="healthy",
-        timestamp=datetime.utcnow()
+        timestamp=datetime.now(timezone.utc)
     )
 
 
@@ -488,14 +709,32 @@ async def api_info():
 
 # ============= Startup Event =============
 
+@app.on_event("startup")
+async def connect_redis():
+    """Connect the rate limiter to Redis if configured"""
+    global redis_client, token_bucket_script
+    
+    if REDIS_URL:
+        redis_client = aioredis.from_url(REDIS_URL)
+        # Script objects use EVALSHA and reload the script on NOSCRIPT
+        token_bucket_script = redis_client.register_script(TOKEN_BUCKET_LUA)
+
+
+@app.on_event("shutdown")
+async def close_redis():
+    """Close the Redis connection pool"""
+    if redis_client is not None:
+        await redis_client.aclose()
+
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize with sample data"""
     # Create sample user
-    user_id = str(uuid4())
-    now = datetime.utcnow()
+    user_id = uuid4()
+    now = datetime.now(timezone.utc)
     
-    sample_user = User(
+    sample_user = UserRecord(
         id=user_id,
         name="John Doe",
         email="john@example.com",
@@ -504,10 +743,11 @@ async def startup_event():
     )
     
     users_db[user_id] = sample_user
+    users_by_created.add(sample_user)
     
     # Create sample post
-    post_id = str(uuid4())
-    sample_post = Post(
+    post_id = uuid4()
+    sample_post = PostRecord(
         id=post_id,
         user_id=user_id,
         title="Welcome Post",
@@ -517,12 +757,22 @@ async def startup_event():
     )
     
     posts_db[post_id] = sample_post
+    posts_by_user[user_id].add(sample_post)
     
-    print(f"✓ Sample user created: {user_id}")
-    print(f"✓ Sample post created: {post_id}")
-    print("✓ API Documentation: http://localhost:8000/docs")
+    logger.info("Sample user created: %s", user_id)
+    logger.info("Sample post created: %s", post_id)
+    logger.info("API Documentation: http://localhost:8000/docs")
 
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # uvloop event loop + httptools parser; extra workers need REDIS_URL for
+    # shared rate limits and a real database for shared users/posts
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8000,
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.getenv("WEB_CONCURRENCY", "1"))
+    )
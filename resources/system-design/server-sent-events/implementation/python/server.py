@@ -11,23 +11,40 @@ Note:
 This implementation serves to illustrate SSE concepts and is not production ready.
 """
 import asyncio
-import json
+import logging
+import orjson
 import random
 
+from bisect import bisect_right
 from collections import deque
-from datetime import datetime
+from datetime import datetime, timezone
 from fastapi import FastAPI, Request
 from fastapi.responses import StreamingResponse, HTMLResponse
+from itertools import islice
 from typing import AsyncGenerator
 
 app = FastAPI(title="Server-Sent Events Example.")
 
-# Event storage for replay
+logger = logging.getLogger("uvicorn.error")
+
+# Event storage for replay: encoded frames and their ids, kept in step
 MAX_HISTORY_SIZE = 100
-event_history = deque()
+event_ids = deque(maxlen=MAX_HISTORY_SIZE)
+event_history = deque(maxlen=MAX_HISTORY_SIZE)
 event_id_counter = 0
 
-async def event_generator(last_event_id: str = None) -> AsyncGenerator[str, None]:
+# Comment frame that keeps idle connections open
+_HEARTBEAT = b": heartbeat\n\n"
+
+def _now_iso() -> str:
+    """Current UTC time as an ISO 8601 string."""
+    return datetime.now(timezone.utc).isoformat()
+
+def _sse_frame(event_id: int, event_type: bytes, data) -> bytes:
+    """Encode one complete SSE event so it goes out in a single send."""
+    return b"id: %d\nevent: %b\ndata: %b\n\n" % (event_id, event_type, orjson.dumps(data))
+
+async def event_generator(last_event_id: str = None) -> AsyncGenerator[bytes, None]:
     """Generate Server-Sent Events.
     
     SSE format:
@@ -39,22 +56,20 @@ async def event_generator(last_event_id: str = None) -> AsyncGenerator[str, None
     event_id_counter += 1
     
     # Send connection established event
-    yield f"id: {event_id_counter}\n"
-    yield f"event: connected\n"
-    yield f"data: {json.dumps({'message': 'Connected to SSE stream.'})}\n\n"
+    yield _sse_frame(event_id_counter, b"connected", {'message': 'Connected to SSE stream.'})
     
     # Replay missed events if Last-Event-ID provided
     if last_event_id:
         try:
             last_id = int(last_event_id)
-            missed_events = [e for e in event_history if e['id'] > last_id]
+            # Ids only increase, so binary search for the first missed event
+            start = bisect_right(event_ids, last_id)
+            missed_events = list(islice(event_history, start, None))
 
-            for event in missed_events:
-                yield f"id: {event['id']}\n"
-                yield f"event: {event['type']}\n"
-                yield f"data: {json.dumps(event['data'])}\n\n"
+            for frame in missed_events:
+                yield frame
 
-        except (ValueError, KeyError):
+        except ValueError:
             pass
     
     # Continuous event stream
@@ -66,45 +81,36 @@ async def event_generator(last_event_id: str = None) -> AsyncGenerator[str, None
             # Generate update event
             event_id_counter += 1
             event_data = {
-                'timestamp': datetime.utcnow().isoformat(),
+                'timestamp': _now_iso(),
                 'value': random.randint(1, 100),
                 'message': f'Update #{event_id_counter}.'
             }
             
-            # Store in history
-            event_history.append({
-                'id': event_id_counter,
-                'type': 'update',
-                'data': event_data
-            })
+            frame = _sse_frame(event_id_counter, b"update", event_data)
             
-            # Keep only last N events
-            if len(event_history) > MAX_HISTORY_SIZE:
-                event_history.popleft()
+            # Store in history (the deques drop the oldest past MAX_HISTORY_SIZE)
+            event_ids.append(event_id_counter)
+            event_history.append(frame)
             
             # Send event
-            yield f"id: {event_id_counter}\n"
-            yield f"event: update\n"
-            yield f"data: {json.dumps(event_data)}\n\n"
+            yield frame
             
             # Periodic heartbeat (every 30 seconds)
             if event_id_counter % 15 == 0:
-                yield f": heartbeat\n\n"
+                yield _HEARTBEAT
         
         except asyncio.CancelledError:
             # Client disconnected
             break
 
-async def notification_generator(user_id: str) -> AsyncGenerator[str, None]:
+async def notification_generator(user_id: str) -> AsyncGenerator[bytes, None]:
     """Generate user-specific notifications.
     """
     global event_id_counter
     event_id_counter += 1
     
     # Send connection established event
-    yield f"id: {event_id_counter}\n"
-    yield f"event: connected\n"
-    yield f"data: {json.dumps({'user_id': user_id, 'message': 'Connected.'})}\n\n"
+    yield _sse_frame(event_id_counter, b"connected", {'user_id': user_id, 'message': 'Connected.'})
     
     notification_types = ['message', 'alert', 'info']
     
@@ -114,58 +120,56 @@ async def notification_generator(user_id: str) -> AsyncGenerator[str, None]:
             
             # Send notification event
             event_id_counter += 1
+            timestamp = _now_iso()
             notification = {
                 'user_id': user_id,
                 'type': random.choice(notification_types),
-                'content': f'Notification at {datetime.utcnow().isoformat()}.',
-                'timestamp': datetime.utcnow().isoformat()
+                'content': f'Notification at {timestamp}.',
+                'timestamp': timestamp
             }
             
-            yield f"id: {event_id_counter}\n"
-            yield f"event: notification\n"
-            yield f"data: {json.dumps(notification)}\n\n"
+            yield _sse_frame(event_id_counter, b"notification", notification)
         
         except asyncio.CancelledError:
             break
 
-async def stock_ticker_generator() -> AsyncGenerator[str, None]:
+async def stock_ticker_generator() -> AsyncGenerator[bytes, None]:
     """Simulate stock price updates.
     """
     global event_id_counter
     event_id_counter += 1
     
     # Send connection established event
-    yield f"id: {event_id_counter}\n"
-    yield f"event: connected\n"
-    yield f"data: {json.dumps({'message': 'Connected to SSE stream.'})}\n\n"
+    yield _sse_frame(event_id_counter, b"connected", {'message': 'Connected to SSE stream.'})
     
+    # Prices in integer cents, so no float rounding per tick
     stocks = {
-        'AAPL': 150.00,
-        'GOOGL': 2800.00,
-        'MSFT': 300.00
+        'AAPL': 15000,
+        'GOOGL': 280000,
+        'MSFT': 30000
     }
+    stock_symbols = tuple(stocks)
+    
+    # Reused for every tick; orjson serializes it before the next update
+    data = {'symbol': None, 'price': None, 'change': None, 'timestamp': None}
     
     while True:
         try:
             await asyncio.sleep(1)
             
             # Random price change
-            symbol = random.choice(list(stocks.keys()))
-            change = random.uniform(-5, 5)
+            symbol = random.choice(stock_symbols)
+            change = random.randint(-500, 500)
             stocks[symbol] += change
             
             # Send price_update event
             event_id_counter += 1
-            data = {
-                'symbol': symbol,
-                'price': round(stocks[symbol], 2),
-                'change': round(change, 2),
-                'timestamp': datetime.utcnow().isoformat()
-            }
+            data['symbol'] = symbol
+            data['price'] = stocks[symbol] / 100
+            data['change'] = change / 100
+            data['timestamp'] = _now_iso()
             
-            yield f"id: {event_id_counter}\n"
-            yield f"event: price_update\n"
-            yield f"data: {json.dumps(data)}\n\n"
+            yield _sse_frame(event_id_counter, b"price_update", data)
         
         except asyncio.CancelledError:
             break
@@ -337,14 +341,19 @@ async def health_check():
     return {
         "status": "healthy",
         "active_events": len(event_history),
-        "timestamp": datetime.utcnow().isoformat()
+        "timestamp": _now_iso()
     }
 
 
+@app.on_event("startup")
+async def startup_event():
+    """Log where the test client is served.
+    """
+    logger.info("Test client: http://localhost:8000")
+
+
 if __name__ == "__main__":
     import uvicorn
 
-    print("SSE server starting...")
-    print("Test client: http://localhost:8000")
-
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Single worker: event history and ids live in this process
+    uvicorn.run(app, host="0.0.0.0", port=8000, loop="uvloop", http="httptools")
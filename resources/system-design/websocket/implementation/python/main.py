@@ -11,104 +11,370 @@ Demonstrates:
 """
 
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
-from fastapi.responses import HTMLResponse
-from typing import Dict, Set
-from datetime import datetime
+from fastapi.responses import HTMLResponse, Response
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+from datetime import datetime, timezone
 import asyncio
-import json
-import uuid
+import itertools
+import logging
+import msgspec
+import orjson
+import os
+import time
 
 app = FastAPI(title="WebSocket Example")
 
+logger = logging.getLogger("uvicorn.error")
+
+# Outbound delivery tuning
+SEND_TIMEOUT = 5.0  # seconds before a stuck client is treated as dead
+QUEUE_SIZE = 256  # pending messages per client before it is dropped
+BATCH_WINDOW = 0.002  # seconds to let a burst queue up; 0 skips the wait but still coalesces
+BATCH_MAX = 64  # messages per frame; keep frames well within socket buffers
+HEARTBEAT_INTERVAL = 30  # seconds between heartbeats to every client
+
+# Cached ISO timestamp shared by every outgoing message
+CLOCK_INTERVAL = 0.1  # seconds between refreshes
+_now_iso = datetime.now(timezone.utc).isoformat()
+
+# Cross-worker fan-out: broadcasts go through Redis pub/sub when REDIS_URL is
+# set, otherwise they are delivered in this process only
+REDIS_URL = os.getenv("REDIS_URL")
+BUS_CHANNEL = "ws:broadcast"
+BUS_RETRY_MIN = 0.5  # seconds before resubscribing after a Redis failure
+BUS_RETRY_MAX = 30.0  # backoff cap
+WORKER_ID = 0  # tags this process's bus messages and client ids; assigned by Redis
+WORKER_ID_BITS = 20  # ids are WORKER_ID << 32 + n, kept below 2**53 for JavaScript
+redis_client = None
+
+# Encoded /stats response and the monotonic time it expires
+STATS_TTL = 1.0  # seconds
+_stats_cache = (0.0, b"")
+
+
+async def _tick_clock():
+    """Refresh the cached timestamp so messages don't each build a datetime"""
+    global _now_iso
+    while True:
+        _now_iso = datetime.now(timezone.utc).isoformat()
+        await asyncio.sleep(CLOCK_INTERVAL)
+
+
+class ClientMessage(msgspec.Struct):
+    """Inbound message, decoded and validated straight from JSON"""
+    type: str = "message"
+    room: Optional[str] = None
+    rooms: Optional[List[str]] = None
+    # Kept as the client's raw JSON bytes and relayed without re-encoding
+    data: msgspec.Raw = msgspec.Raw(b"null")
+
+
+decode_message = msgspec.json.Decoder(ClientMessage).decode
+# Outbound encoder; unlike orjson it writes msgspec.Raw values through as-is
+encode_message = msgspec.json.Encoder().encode
+
+
+class Connection(NamedTuple):
+    websocket: WebSocket
+    queue: asyncio.Queue  # encoded messages waiting to be sent
+    writer: asyncio.Task  # drains queue onto websocket
+
+
 # Connection manager
 class ConnectionManager:
     def __init__(self):
         # All active connections
-        self.active_connections: Dict[str, WebSocket] = {}
+        self.active_connections: Dict[int, Connection] = {}
         # Rooms/channels subscriptions
-        self.rooms: Dict[str, Set[str]] = {}
+        self.rooms: Dict[str, Set[int]] = {}
+        # Reverse index: rooms each client has joined
+        self.client_rooms: Dict[int, Set[str]] = {}
+        # Member count per room, kept alongside rooms for cheap stats
+        self.room_sizes: Dict[str, int] = {}
+        # Integer client ids: cheap to hash on every fan-out lookup. With the
+        # Redis bus they start at WORKER_ID << 32 to stay unique across workers
+        # (and below 2**53, so JavaScript reads them exactly)
+        self._ids = itertools.count(1)
+        self.id_base = 0
+        # Redis client to publish broadcasts on, if other workers share them
+        self.bus = None
+        # Close handshakes in flight for dropped clients (keeps the tasks alive)
+        self._closing: Set[asyncio.Task] = set()
     
-    async def connect(self, websocket: WebSocket) -> str:
+    async def connect(self, websocket: WebSocket) -> int:
         """Accept and register a new connection"""
         await websocket.accept()
-        client_id = str(uuid.uuid4())
-        self.active_connections[client_id] = websocket
+        client_id = self.id_base + next(self._ids)
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        writer = asyncio.create_task(self._writer(client_id, websocket, queue))
+        self.active_connections[client_id] = Connection(websocket, queue, writer)
         return client_id
     
-    def disconnect(self, client_id: str):
+    def disconnect(self, client_id: int, close: bool = False):
         """Remove a connection"""
-        if client_id in self.active_connections:
-            del self.active_connections[client_id]
+        self.disconnect_many((client_id,), close)
+    
+    def disconnect_many(self, client_ids: Iterable[int], close: bool = False):
+        """Remove several connections, visiting each affected room once.
+        
+        close=True also closes the sockets of clients dropped by the server
+        (send failures, full queues), so their endpoint loops end too.
+        """
+        dead = set(client_ids)
+        affected_rooms = set()
+        current = asyncio.current_task()
         
-        # Remove from all rooms
-        for room in self.rooms.values():
-            room.discard(client_id)
+        for client_id in dead:
+            connection = self.active_connections.pop(client_id, None)
+            if connection is not None:
+                if connection.writer is not current:
+                    connection.writer.cancel()
+                if close:
+                    task = asyncio.create_task(self._close(connection.websocket))
+                    self._closing.add(task)
+                    task.add_done_callback(self._closing.discard)
+            affected_rooms.update(self.client_rooms.pop(client_id, ()))
+        
+        # Only the dead clients' rooms change; drop rooms left empty
+        for room in affected_rooms:
+            members = self.rooms.get(room)
+            if members is not None:
+                members -= dead
+                if not members:
+                    del self.rooms[room]
+                    del self.room_sizes[room]
+                else:
+                    self.room_sizes[room] = len(members)
+    
+    @staticmethod
+    async def _close(websocket: WebSocket):
+        """Close a dropped client's socket; it may already be gone"""
+        try:
+            await asyncio.wait_for(websocket.close(code=1008), timeout=SEND_TIMEOUT)
+        except Exception:
+            pass
     
-    async def send_personal_message(self, message: dict, client_id: str):
+    async def _writer(self, client_id: int, websocket: WebSocket, queue: asyncio.Queue):
+        """Send queued messages to one client, so a slow socket only delays itself"""
+        try:
+            while True:
+                batch = [await queue.get()]
+                if BATCH_WINDOW:
+                    # Let a burst build up, then send it as a single frame
+                    await asyncio.sleep(BATCH_WINDOW)
+                while len(batch) < BATCH_MAX and not queue.empty():
+                    batch.append(queue.get_nowait())
+                
+                # Payloads are already JSON, so join them into an array as-is
+                payload = batch[0] if len(batch) == 1 else b"[" + b",".join(batch) + b"]"
+                await asyncio.wait_for(websocket.send_bytes(payload), timeout=SEND_TIMEOUT)
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            self.disconnect(client_id, close=True)
+    
+    def _enqueue(self, client_id: int, payload: bytes) -> bool:
+        """Queue payload for a client; False if it is gone or too far behind"""
+        connection = self.active_connections.get(client_id)
+        if connection is None:
+            return False
+        
+        try:
+            connection.queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            return False
+        return True
+    
+    @staticmethod
+    def _encode(message: dict) -> bytes:
+        """Encode a message once for every recipient (sent as a binary frame)"""
+        return encode_message(message)
+    
+    async def send_personal_message(self, message: dict, client_id: int):
         """Send message to specific client"""
         if client_id in self.active_connections:
-            await self.active_connections[client_id].send_json(message)
+            if not self._enqueue(client_id, self._encode(message)):
+                self.disconnect(client_id, close=True)
     
-    async def broadcast(self, message: dict, exclude: str = None):
-        """Broadcast message to all connected clients"""
-        disconnected = []
+    def deliver(self, payload: bytes, exclude: int = None, rooms: List[str] = None):
+        """Queue an encoded message for local clients (all of them, or those in rooms)"""
+        if rooms is None:
+            targets = self.active_connections
+        elif len(rooms) == 1:
+            targets = self.rooms.get(rooms[0], ())
+        else:
+            # Union first so a client in several rooms gets a single copy
+            targets = set().union(*(self.rooms.get(room, ()) for room in rooms))
         
-        for client_id, connection in self.active_connections.items():
-            if client_id == exclude:
-                continue
-            
-            try:
-                await connection.send_json(message)
-            except:
-                disconnected.append(client_id)
+        # Most broadcasts exclude nobody; skip the per-recipient compare for them
+        if exclude is None:
+            disconnected = [
+                client_id
+                for client_id in targets
+                if not self._enqueue(client_id, payload)
+            ]
+        else:
+            disconnected = [
+                client_id
+                for client_id in targets
+                if client_id != exclude and not self._enqueue(client_id, payload)
+            ]
         
         # Clean up disconnected clients
-        for client_id in disconnected:
-            self.disconnect(client_id)
+        self.disconnect_many(disconnected, close=True)
     
-    async def broadcast_to_room(self, room: str, message: dict, exclude: str = None):
-        """Broadcast message to all clients in a room"""
-        if room not in self.rooms:
-            return
+    async def _publish(self, message: dict, exclude: int = None, rooms: List[str] = None):
+        """Encode once, then deliver locally or hand off to every worker via Redis"""
+        payload = self._encode(message)
         
-        disconnected = []
-        
-        for client_id in self.rooms[room]:
-            if client_id == exclude:
-                continue
-            
-            if client_id not in self.active_connections:
-                disconnected.append(client_id)
-                continue
-            
+        if self.bus is None:
+            self.deliver(payload, exclude, rooms)
+        else:
+            # Header line routes the message; the payload is forwarded untouched
+            header = orjson.dumps([WORKER_ID, exclude, rooms])
             try:
-                await self.active_connections[client_id].send_json(message)
-            except:
-                disconnected.append(client_id)
+                await self.bus.publish(BUS_CHANNEL, header + b"\n" + payload)
+            except RedisError:
+                # Other workers miss this one, but local clients still get it
+                logger.exception("Redis publish failed; delivering locally only")
+                self.deliver(payload, exclude, rooms)
+    
+    async def broadcast(self, message: dict, exclude: int = None):
+        """Broadcast message to all connected clients"""
+        await self._publish(message, exclude)
+    
+    async def broadcast_to_room(self, room: str, message: dict, exclude: int = None):
+        """Broadcast message to all clients in a room"""
+        # Other workers may have members even when this one has none
+        if self.bus is None and room not in self.rooms:
+            return
         
-        # Clean up
-        for client_id in disconnected:
-            self.rooms[room].discard(client_id)
+        await self._publish(message, exclude, [room])
+    
+    async def broadcast_to_rooms(self, rooms: List[str], message: dict, exclude: int = None):
+        """Broadcast message once to every client in any of the rooms"""
+        await self._publish(message, exclude, list(rooms))
     
-    def join_room(self, client_id: str, room: str):
+    def join_room(self, client_id: int, room: str):
         """Add client to a room"""
+        # A dropped client must not be put back into rooms
+        if client_id not in self.active_connections:
+            return
+        
         if room not in self.rooms:
             self.rooms[room] = set()
         self.rooms[room].add(client_id)
+        self.room_sizes[room] = len(self.rooms[room])
+        self.client_rooms.setdefault(client_id, set()).add(room)
     
-    def leave_room(self, client_id: str, room: str):
-        """Remove client from a room"""
-        if room in self.rooms:
-            self.rooms[room].discard(client_id)
+    def leave_room(self, client_id: int, room: str):
+        """Remove client from a room, dropping the room once it is empty"""
+        members = self.rooms.get(room)
+        if members is not None:
+            members.discard(client_id)
+            if not members:
+                del self.rooms[room]
+                del self.room_sizes[room]
+            else:
+                self.room_sizes[room] = len(members)
+        
+        joined = self.client_rooms.get(client_id)
+        if joined is not None:
+            joined.discard(room)
+            if not joined:
+                del self.client_rooms[client_id]
     
     def get_room_count(self, room: str) -> int:
         """Get number of clients in a room"""
-        return len(self.rooms.get(room, set()))
+        return self.room_sizes.get(room, 0)
 
 
 manager = ConnectionManager()
 
 
+@app.on_event("startup")
+async def start_clock():
+    """Start the shared timestamp ticker"""
+    app.state.clock_task = asyncio.create_task(_tick_clock())
+
+
+@app.on_event("startup")
+async def start_heartbeat():
+    """Start the shared heartbeat ticker"""
+    app.state.heartbeat_task = asyncio.create_task(send_heartbeats())
+
+
+async def _relay_bus():
+    """Deliver broadcasts published by any worker to this worker's clients.
+    
+    Resubscribes with exponential backoff when the Redis connection drops;
+    messages published while disconnected are not replayed.
+    """
+    delay = BUS_RETRY_MIN
+    while True:
+        pubsub = redis_client.pubsub()
+        try:
+            await pubsub.subscribe(BUS_CHANNEL)
+            delay = BUS_RETRY_MIN
+            
+            async for message in pubsub.listen():
+                if message["type"] != "message":
+                    continue
+                
+                try:
+                    header, payload = message["data"].split(b"\n", 1)
+                    origin, exclude, rooms = orjson.loads(header)
+                    # Client ids are per worker, so exclusion only applies at the origin
+                    manager.deliver(payload, exclude if origin == WORKER_ID else None, rooms)
+                except Exception:
+                    logger.exception("Dropped malformed bus message")
+        except RedisError:
+            logger.exception("Redis bus subscription lost; retrying in %.1fs", delay)
+        finally:
+            await pubsub.aclose()
+        
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, BUS_RETRY_MAX)
+
+
+def _log_bus_exit(task: asyncio.Task):
+    """Report a relay task that stopped for any reason other than shutdown"""
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Redis bus relay stopped", exc_info=task.exception())
+
+
+@app.on_event("startup")
+async def connect_redis():
+    """Join the Redis broadcast bus if configured"""
+    global redis_client, WORKER_ID
+    
+    if REDIS_URL:
+        redis_client = aioredis.from_url(REDIS_URL)
+        # A shared counter gives every worker a distinct id; fails startup if
+        # Redis is down, since client ids handed out before it could collide
+        WORKER_ID = await redis_client.incr("ws:worker_id") & ((1 << WORKER_ID_BITS) - 1)
+        app.state.bus_task = asyncio.create_task(_relay_bus())
+        app.state.bus_task.add_done_callback(_log_bus_exit)
+        manager.id_base = WORKER_ID << 32
+        manager.bus = redis_client
+
+
+@app.on_event("shutdown")
+async def close_redis():
+    """Close the Redis connection pool"""
+    if redis_client is not None:
+        app.state.bus_task.cancel()
+        await redis_client.aclose()
+
+
+@app.on_event("startup")
+async def log_test_client():
+    """Log where the test client is served"""
+    logger.info("Test client: http://localhost:8000")
+
+
 # ============= WebSocket Endpoints =============
 
 @app.websocket("/ws")
@@ -120,8 +386,13 @@ async def websocket_endpoint(websocket: WebSocket):
     {
         "type": "message" | "subscribe" | "unsubscribe" | "ping",
         "room": "room_name" (optional),
+        "rooms": ["room_name", ...] (optional, message only),
         "data": {...}
     }
+    
+    Server messages are sent as binary frames of UTF-8 JSON. A frame holds
+    either one message object or, when several were queued together, a
+    JSON array of them in order.
     """
     client_id = await manager.connect(websocket)
     
@@ -130,37 +401,34 @@ async def websocket_endpoint(websocket: WebSocket):
         await manager.send_personal_message({
             "type": "connected",
             "client_id": client_id,
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": _now_iso
         }, client_id)
         
         # Broadcast join notification
         await manager.broadcast({
             "type": "user_joined",
             "client_id": client_id,
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": _now_iso
         }, exclude=client_id)
         
-        # Start heartbeat
-        heartbeat_task = asyncio.create_task(send_heartbeat(websocket, client_id))
-        
         while True:
-            # Receive message
-            data = await websocket.receive_text()
+            # Receive message (text or binary frame)
+            data = await receive_data(websocket)
             
             try:
-                message = json.loads(data)
-                message_type = message.get("type", "message")
+                message = decode_message(data)
+                message_type = message.type
                 
                 if message_type == "ping":
                     # Respond to ping
                     await manager.send_personal_message({
                         "type": "pong",
-                        "timestamp": datetime.utcnow().isoformat()
+                        "timestamp": _now_iso
                     }, client_id)
                 
                 elif message_type == "subscribe":
                     # Join room
-                    room = message.get("room")
+                    room = message.room
                     if room:
                         manager.join_room(client_id, room)
                         await manager.send_personal_message({
@@ -178,7 +446,7 @@ async def websocket_endpoint(websocket: WebSocket):
                 
                 elif message_type == "unsubscribe":
                     # Leave room
-                    room = message.get("room")
+                    room = message.room
                     if room:
                         manager.leave_room(client_id, room)
                         await manager.send_personal_message({
@@ -195,63 +463,91 @@ async def websocket_endpoint(websocket: WebSocket):
                 
                 elif message_type == "message":
                     # Handle regular message
-                    room = message.get("room")
+                    room = message.room
+                    rooms = message.rooms
                     
                     msg_data = {
                         "type": "message",
                         "client_id": client_id,
-                        "data": message.get("data"),
-                        "timestamp": datetime.utcnow().isoformat()
+                        "data": message.data,
+                        "timestamp": _now_iso
                     }
                     
-                    if room:
-                        # Broadcast to room
-                        msg_data["room"] = room
-                        await manager.broadcast_to_room(room, msg_data)
-                    else:
-                        # Broadcast to all
-                        await manager.broadcast(msg_data)
+                    try:
+                        if rooms:
+                            # Broadcast to several rooms, one copy per client
+                            msg_data["rooms"] = rooms
+                            await manager.broadcast_to_rooms(rooms, msg_data)
+                        elif room:
+                            # Broadcast to room
+                            msg_data["room"] = room
+                            await manager.broadcast_to_room(room, msg_data)
+                        else:
+                            # Broadcast to all
+                            await manager.broadcast(msg_data)
+                    except msgspec.EncodeError:
+                        # data is relayed as Raw; this only guards the surrounding fields
+                        await manager.send_personal_message({
+                            "type": "error",
+                            "error": "Invalid message format"
+                        }, client_id)
                 
-            except json.JSONDecodeError:
+            except msgspec.ValidationError:
+                await manager.send_personal_message({
+                    "type": "error",
+                    "error": "Invalid message format"
+                }, client_id)
+            
+            except msgspec.DecodeError:
                 await manager.send_personal_message({
                     "type": "error",
                     "error": "Invalid JSON format"
                 }, client_id)
     
     except WebSocketDisconnect:
-        print(f"Client {client_id} disconnected")
+        logger.debug("Client %s disconnected", client_id)
     
     finally:
         # Cleanup
-        heartbeat_task.cancel()
         manager.disconnect(client_id)
         
-        # Notify others
-        await manager.broadcast({
-            "type": "user_left",
-            "client_id": client_id,
-            "timestamp": datetime.utcnow().isoformat()
-        })
+        # Notify others; a failure here must not mask the original error
+        try:
+            await manager.broadcast({
+                "type": "user_left",
+                "client_id": client_id,
+                "timestamp": _now_iso
+            })
+        except Exception:
+            logger.exception("Failed to announce client %s leaving", client_id)
 
 
-async def send_heartbeat(websocket: WebSocket, client_id: str):
-    """Send periodic heartbeat to keep connection alive"""
-    try:
-        while True:
-            await asyncio.sleep(30)  # Every 30 seconds
-            await manager.send_personal_message({
-                "type": "heartbeat",
-                "timestamp": datetime.utcnow().isoformat()
-            }, client_id)
-    except asyncio.CancelledError:
-        pass
+async def receive_data(websocket: WebSocket):
+    """Receive the next frame's payload as-is, skipping a decode for binary frames"""
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000))
+    
+    data = message.get("bytes")
+    return data if data is not None else message["text"]
+
+
+async def send_heartbeats():
+    """Send periodic heartbeats to keep connections alive, one task for all clients"""
+    while True:
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        # Local clients only: every worker runs its own ticker
+        manager.deliver(orjson.dumps({
+            "type": "heartbeat",
+            "timestamp": _now_iso
+        }))
 
 
 # ============= Chat Room WebSocket =============
 
 @app.websocket("/ws/chat/{room}")
 async def chat_room(websocket: WebSocket, room: str):
-    """Dedicated chat room endpoint"""
+    """Dedicated chat room endpoint (server frames may batch messages like /ws)"""
     client_id = await manager.connect(websocket)
     manager.join_room(client_id, room)
     
@@ -272,7 +568,10 @@ async def chat_room(websocket: WebSocket, room: str):
         }, exclude=client_id)
         
         while True:
-            data = await websocket.receive_text()
+            data = await receive_data(websocket)
+            if isinstance(data, bytes):
+                # Content is relayed as a JSON string, so binary frames must be UTF-8 text
+                data = data.decode("utf-8", "replace")
             
             # Broadcast to room
             await manager.broadcast_to_room(room, {
@@ -280,7 +579,7 @@ async def chat_room(websocket: WebSocket, room: str):
                 "client_id": client_id,
                 "room": room,
                 "content": data,
-                "timestamp": datetime.utcnow().isoformat()
+                "timestamp": _now_iso
             })
     
     except WebSocketDisconnect:
@@ -290,20 +589,21 @@ async def chat_room(websocket: WebSocket, room: str):
         manager.leave_room(client_id, room)
         manager.disconnect(client_id)
         
-        # Notify room
-        await manager.broadcast_to_room(room, {
-            "type": "user_left",
-            "client_id": client_id,
-            "users_count": manager.get_room_count(room)
-        })
+        # Notify room; a failure here must not mask the original error
+        try:
+            await manager.broadcast_to_room(room, {
+                "type": "user_left",
+                "client_id": client_id,
+                "users_count": manager.get_room_count(room)
+            })
+        except Exception:
+            logger.exception("Failed to announce client %s leaving %s", client_id, room)
 
 
 # ============= HTTP Endpoints =============
 
-@app.get("/")
-async def get_index():
-    """Serve a simple test client"""
-    html = """
+# Test client page, encoded once at import
+_INDEX_HTML = """
     <!DOCTYPE html>
     <html>
     <head>
@@ -334,14 +634,22 @@ async def get_index():
             
             function connect() {
                 ws = new WebSocket("ws://localhost:8000/ws");
+                ws.binaryType = "arraybuffer";
+                const decoder = new TextDecoder();
                 
                 ws.onopen = () => {
                     addMessage("Connected");
                 };
                 
                 ws.onmessage = (event) => {
-                    const data = JSON.parse(event.data);
-                    addMessage(`[${data.type}] ${JSON.stringify(data)}`);
+                    const text = event.data instanceof ArrayBuffer
+                        ? decoder.decode(event.data)
+                        : event.data;
+                    // Bursts arrive batched as a JSON array
+                    const parsed = JSON.parse(text);
+                    for (const data of Array.isArray(parsed) ? parsed : [parsed]) {
+                        addMessage(`[${data.type}] ${JSON.stringify(data)}`);
+                    }
                 };
                 
                 ws.onclose = () => {
@@ -391,24 +699,44 @@ async def get_index():
         </script>
     </body>
     </html>
-    """
-    return HTMLResponse(content=html)
+    """.encode()
+
+
+@app.get("/")
+async def get_index():
+    """Serve a simple test client"""
+    return HTMLResponse(content=_INDEX_HTML)
 
 
 @app.get("/stats")
 async def get_stats():
-    """Get connection statistics"""
-    return {
-        "total_connections": len(manager.active_connections),
-        "rooms": {
-            room: len(clients)
-            for room, clients in manager.rooms.items()
-        }
-    }
+    """Get connection statistics (cached briefly for frequent scrapers)"""
+    global _stats_cache
+    expires_at, payload = _stats_cache
+    now = time.monotonic()
+    if now >= expires_at:
+        payload = orjson.dumps({
+            "total_connections": len(manager.active_connections),
+            "rooms": manager.room_sizes
+        })
+        _stats_cache = (now + STATS_TTL, payload)
+    return Response(content=payload, media_type="application/json")
 
 
 if __name__ == "__main__":
     import uvicorn
-    print("WebSocket server starting...")
-    print("Test client: http://localhost:8000")
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Extra workers need REDIS_URL so broadcasts reach every worker's clients;
+    # /stats and room counts stay per worker.
+    # permessage-deflate is off: broadcasts would compress the same payload once per recipient.
+    # This only applies here; with the CLI pass it explicitly:
+    #   uvicorn main:app --loop uvloop --http httptools --ws-per-message-deflate false
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8000,
+        loop="uvloop",
+        http="httptools",
+        ws="websockets",
+        ws_per_message_deflate=False,
+        workers=int(os.getenv("WEB_CONCURRENCY", "1")),
+    )